@@ -116,6 +116,10 @@ def main(sysargs = sys.argv[1:]):
           type=str,
           default='',
           help='Specify the name of the Markdown output file, for use with --markdown flags')
+    p.add('--force',
+          action='store_true',
+          default=False,
+          help='Overwrite an existing output file without waiting')
 
     # View options for columns
     g = p.add_mutually_exclusive_group()
@@ -117,6 +117,16 @@ class GameData(object):
         ha_score_col = self.df[['homeScore', 'awayScore']].apply(ha_score_lambda, axis=1)
         self.df = self.df.assign(**{'homeAwayScore': ha_score_col.values})
 
+        # Turn team emoji hex codes into the emoji characters themselves,
+        # once here rather than every time a table is rendered
+        # (only needed if emoji are displayed; only a handful of
+        # distinct teams, so convert each unique value once)
+        if self.options.name_style == 'emoji':
+            for column_header in self.df.columns:
+                if column_header[-5:]=='Emoji':
+                    emoji_map = {u: chr(int(u, 16)) for u in self.df[column_header].unique()}
+                    self.df[column_header] = self.df[column_header].map(emoji_map)
+
     def _filter_ties(self):
         mask = self.df.loc[self.df['homeScore']!=self.df['awayScore']]
         return mask
@@ -1,6 +1,9 @@
+import contextlib
 import time
 import sys
 import os
+import numpy as np
+import pandas as pd
 from rich.console import Console
 from rich.table import Table
 from .game_data import GameData, REASON2FUNCTION
@@ -12,6 +15,31 @@ from .util import (
 
 NAMESTYLE_CHOICES = ['long', 'short', 'emoji']
 
+# Map name style to the suffix of the corresponding dataframe team column
+NAME_STYLE_SUFFIX = {
+    'long': 'TeamName',
+    'short': 'TeamNickname',
+    'emoji': 'TeamEmoji',
+}
+
+# Map reason strings to the start of their table description
+REASON_DESCRIPTIONS = {
+    'blowout': "Blowout games (games with high scores and high run differentials) ",
+    'shutout': "Shutout games (games where the loser had zero runs) ",
+    'shame': "Shame games (games where the loser was shamed) ",
+    'underdog': "Underdog games (games where the underdog won with large run differential) ",
+    'maxedout': "Maxed out games (high-scoring one-run games) ",
+    'defensive': "Defensive games (low-scoring one-run games) ",
+}
+
+
+def object_to_str(arr):
+    """
+    Convert an array of objects to strings, leaving
+    missing values (None/NaN) as empty strings
+    """
+    return np.array(['' if pd.isna(v) else str(v) for v in arr], dtype=object)
+
 
 class View(object):
     """
@@ -22,10 +50,17 @@ class View(object):
         self.nresults = options.n_results
         self.game_data = GameData(options)
         self.column_headers, self.nice_column_headers = self.assemble_column_headers(options)
+
+        # Odds columns are only used to annotate team names, never displayed
+        display_headers = [(j, k) for j, k in zip(self.column_headers, self.nice_column_headers) if 'Odds' not in j]
+        self.display_column_headers = [j for j, _ in display_headers]
+        self.display_nice_column_headers = [k for _, k in display_headers]
         self.name_style = options.name_style
 
         # For table description
         self.options = options
+        _, _, ALLTEAMS = get_league_division_team_data()
+        self._allteams = frozenset(ALLTEAMS)
 
         # If an output file is specified, check if it exists and if the path to it exists
         if options.output == '':
@@ -33,12 +68,13 @@ class View(object):
         else:
             self.output_file = options.output
             if os.path.exists(self.output_file):
-                print("WARNING: Overwriting an existing file %s"%(self.output_file))
-                print("Waiting 5 seconds before proceeding")
-                time.sleep(5)
+                # Only warn and wait if there is something to lose
+                if os.path.getsize(self.output_file) > 0 and not options.force:
+                    print("WARNING: Overwriting an existing file %s"%(self.output_file))
+                    print("Waiting 5 seconds before proceeding")
+                    time.sleep(5)
                 # Clear out the file
-                with open(self.output_file, 'w') as f:
-                    f.write("")
+                os.truncate(self.output_file, 0)
             else:
                 output_file_path = os.path.abspath(os.path.dirname(self.output_file))
                 if not os.path.exists(output_file_path):
@@ -54,19 +90,9 @@ class View(object):
         based on filters the user provides
         """
         options = self.options
-        if reason == 'blowout':
-            desc = "Blowout games (games with high scores and high run differentials) "
-        elif reason == 'shutout':
-            desc = "Shutout games (games where the loser had zero runs) "
-        elif reason == 'shame':
-            desc = "Shame games (games where the loser was shamed) "
-        elif reason == 'underdog':
-            desc = "Underdog games (games where the underdog won with large run differential) "
-        elif reason == 'maxedout':
-            desc = "Maxed out games (high-scoring one-run games) "
-        elif reason == 'defensive':
-            desc = "Defensive games (low-scoring one-run games) "
-        else:
+        try:
+            desc = REASON_DESCRIPTIONS[reason]
+        except KeyError:
             raise Exception("Error: reason not recognized. Valid reasons: %s"%(", ".join(list(REASON2FUNCTION.keys()))))
 
         if 'all' in options.season:
@@ -80,10 +106,9 @@ class View(object):
         if options.postseason :
             desc += "(postseason only) "
 
-        _, _, ALLTEAMS = get_league_division_team_data()
         if len(options.team)==1:
             desc += "for team %s"%("".join(options.team))
-        elif len(set(ALLTEAMS) - set(options.team)) == 0:
+        elif len(self._allteams.difference(options.team)) == 0:
             desc += "for all teams"
         else:
             desc += "for teams %s"%(", ".join(options.team))
@@ -110,6 +135,9 @@ class View(object):
         column_names = ['season', 'day', 'isPostseason']
         nice_column_names = ["Sea", "Day", "Post"]
 
+        # Suffix for team name columns, based on name style
+        suffix = NAME_STYLE_SUFFIX[options.name_style]
+
         # Next columns will be winner/loser or home/away,
         # depending on the win_loss vs home_away options.
         if options.win_loss:
@@ -120,12 +148,7 @@ class View(object):
                 nice_column_names.append("WP")
 
             # Winning team name
-            if options.name_style=='long':
-                column_names.append('winningTeamName')
-            elif options.name_style=='short':
-                column_names.append('winningTeamNickname')
-            elif options.name_style=='emoji':
-                column_names.append('winningTeamEmoji')
+            column_names.append('winning' + suffix)
             nice_column_names.append("Winner")
 
             # W odds (not printed)
@@ -141,12 +164,7 @@ class View(object):
             nice_column_names.append("L Odds")
 
             # Losing team name
-            if options.name_style=='long':
-                column_names.append('losingTeamName')
-            elif options.name_style=='short':
-                column_names.append('losingTeamNickname')
-            elif options.name_style=='emoji':
-                column_names.append('losingTeamEmoji')
+            column_names.append('losing' + suffix)
             nice_column_names.append("Loser")
 
             # Losing pitcher
@@ -162,12 +180,7 @@ class View(object):
                 nice_column_names.append("Home P")
 
             # Home team name
-            if options.name_style=='long':
-                column_names.append('homeTeamName')
-            elif options.name_style=='short':
-                column_names.append('homeTeamNickname')
-            elif options.name_style=='emoji':
-                column_names.append('homeTeamEmoji')
+            column_names.append('home' + suffix)
             nice_column_names.append("Home")
 
             # H odds (not printed)
@@ -183,12 +196,7 @@ class View(object):
             nice_column_names.append("A Odds")
 
             # Away team name
-            if options.name_style=='long':
-                column_names.append('awayTeamName')
-            elif options.name_style=='short':
-                column_names.append('awayTeamNickname')
-            elif options.name_style=='emoji':
-                column_names.append('awayTeamEmoji')
+            column_names.append('away' + suffix)
             nice_column_names.append("Away")
 
             # Away pitcher
@@ -198,36 +206,19 @@ class View(object):
 
         return (column_names, nice_column_names)
 
-
-class RichView(View):
-    """
-    Create a table and render it using rich
-    """
-    def make_table(self):
-        """
-        Get a list of DataFrames and descriptions, 
-        and render them as tables with rich.
-        """
-        # Get dataframes and descriptions
-        tables = self.game_data.parse()
-        for table in tables:
-            reason, df = table
-            desc = self.table_description(reason)
-            self._render_table(desc, df, reason)
-
-    def _render_table(self, description, df, reason):
+    def _prepare_cut(self, df, reason, postseason_value_map):
         """
-        Render a table using rich
+        Cut a table's data down to the rows and columns that will be
+        displayed, and format it for printing (every value a string).
+        The only thing that differs between views is how postseason
+        games are marked, given by postseason_value_map.
         """
         # Cut data to table data only
-        cut = df[self.column_headers][:min(len(df), self.nresults)].copy()
-
-        # Bump season and game numbers by one (zero-indexed in dataframe)
-        # (Pandas is soooo intuitive)
-        plusone = lambda x : x + 1
-        new_season_column = cut['season'].apply(plusone)
-        new_game_column = cut['day'].apply(plusone)
-        cut = cut.assign(**{'season': new_season_column, 'day': new_game_column})
+        # (slice rows first, so we only copy the rows we display,
+        # and leave out the odds columns, which are never displayed)
+        n = min(len(df), self.nresults)
+        top = df.iloc[:n]
+        cut = top.loc[:, self.display_column_headers].copy()
 
         # Create name and odds labels
         if self.options.win_loss:
@@ -235,12 +226,7 @@ class RichView(View):
         else:
             pre = ['home','away']
 
-        if self.options.name_style=='short':
-            namelabels = [j + 'TeamNickname' for j in pre]
-        elif self.options.name_style=='long':
-            namelabels = [j + 'TeamName' for j in pre]
-        elif self.options.name_style=='emoji':
-            namelabels = [j + 'TeamEmoji' for j in pre]
+        namelabels = [j + NAME_STYLE_SUFFIX[self.name_style] for j in pre]
 
         oddslabels = [j + 'Odds' for j in pre]
 
@@ -248,36 +234,72 @@ class RichView(View):
         if reason=='underdog':
             # Eventually we may want to do this with ALL reasons
             for namelabel, oddslabel in zip(namelabels, oddslabels):
-                addodds = lambda row: "%s (%d%%)"%(row[namelabel], round(100*row[oddslabel]))
                 try:
-                    cut[namelabel] = cut[[namelabel, oddslabel]].apply(addodds, axis=1)
+                    names = cut[namelabel].to_numpy()
+                    odds = (100*top[oddslabel].to_numpy()).round().astype(int)
+                    cut[namelabel] = ["%s (%d%%)"%(name, odd) for name, odd in zip(names, odds)]
                 except KeyError:
                     print(cut.columns)
                     print(cut)
                     sys.exit(1)
 
-        # Remove the odds columns
-        cut.drop(oddslabels, axis=1, inplace=True)
+        # Make everything in the dataframe a string,
+        # formatting each column (including string columns,
+        # which may have missing values) in one pass over its values
+        formatters = self._build_column_formatters(cut, postseason_value_map)
+        for column_header, formatter in formatters.items():
+            cut[column_header] = formatter(cut[column_header].to_numpy())
 
-        # Remove the odds headers
-        self.column_headers = [j for j in self.column_headers if 'Odds' not in j]
-        self.nice_column_headers = [j for j in self.nice_column_headers if 'Odds' not in j]
+        return cut
 
-        # Format the isPostseason column for printing (empty space if not, else Y)
-        postseason_lambda = lambda c: ' ' if c is False else 'Y'
-        new_postseason_column = cut['isPostseason'].apply(postseason_lambda)
-        cut = cut.assign(**{'isPostseason': new_postseason_column.values})
+    def _build_column_formatters(self, cut, postseason_value_map):
+        """
+        Build a formatter for every column of table data. Each formatter
+        takes an array with the whole column and returns an array of
+        strings. Object columns are not assumed to be strings already,
+        since they can also hold missing values (None/NaN).
+        """
+        formatters = {}
+        for column_header in cut.columns:
+            if column_header=='season' or column_header=='day':
+                # Bump season and game numbers by one (zero-indexed in dataframe)
+                formatters[column_header] = lambda arr: (arr + 1).astype(str)
+            elif column_header=='isPostseason':
+                # Mark postseason games (one vectorized branch over the boolean column)
+                formatters[column_header] = lambda arr: np.where(
+                    arr.astype(bool),
+                    postseason_value_map[True],
+                    postseason_value_map[False]
+                )
+            elif cut[column_header].dtype == object:
+                # Object columns can hold missing values (None/NaN) as well as strings
+                formatters[column_header] = object_to_str
+            else:
+                formatters[column_header] = lambda arr: arr.astype(str)
+        return formatters
 
-        # Format any column ending in "Emoji" as emoji (hope this works!)
-        # (there must be a more efficient way to do this, but I really, really hate pandas now.)
-        for column_header in self.column_headers:
-            emoji_lambda = lambda x: chr(int(x, 16))
-            if column_header[-5:]=='Emoji':
-                new_column = cut[column_header].apply(emoji_lambda)
-                cut = cut.assign(**{column_header: new_column})
 
-        # Make everything in the dataframe a string
-        cut = cut.applymap(str)
+class RichView(View):
+    """
+    Create a table and render it using rich
+    """
+    def make_table(self):
+        """
+        Get a list of DataFrames and descriptions, 
+        and render them as tables with rich.
+        """
+        # Get dataframes and descriptions
+        tables = self.game_data.parse()
+        for table in tables:
+            reason, df = table
+            desc = self.table_description(reason)
+            self._render_table(desc, df, reason)
+
+    def _render_table(self, description, df, reason):
+        """
+        Render a table using rich
+        """
+        cut = self._prepare_cut(df, reason, {False: ' ', True: 'Y'})
 
         console = Console()
 
@@ -285,7 +307,7 @@ class RichView(View):
 
         table = Table(show_header=True, header_style="bold")
 
-        for column_header, nice_column_header in zip(self.column_headers, self.nice_column_headers):
+        for column_header, nice_column_header in zip(self.display_column_headers, self.display_nice_column_headers):
             if column_header=="losingScore" or column_header=="awayScore":
                 # Justify losing/away scores to the right (opposite winning/home scores)
                 table.add_column(nice_column_header, justify="right")
@@ -295,146 +317,89 @@ class RichView(View):
             else:
                 table.add_column(nice_column_header)
 
-        for i, row in cut.iterrows():
-            table.add_row(*row.values)
+        for row in cut.to_numpy():
+            table.add_row(*row)
 
         console.print(table)
-        console.print("\n")
-        print(description)
-        console.print("\n\n")
+        # Write the description and trailing whitespace in one go
+        sys.stdout.write("\n\n%s\n\n\n\n"%(description))
 
 
 class MarkdownView(View):
     """
     Create a table and render it as a Markdown table
     """
-    # TODO: integrate some of the shared rich/markdown view functionality
+    def __init__(self, options):
+        super().__init__(options)
+
+        # Postseason games are marked next to the day, so there is
+        # no postseason column in Markdown tables
+        markdown_headers = [
+            (j, k) for j, k in zip(self.display_column_headers, self.display_nice_column_headers)
+            if j != 'isPostseason'
+        ]
+        self.markdown_nice_column_headers = [k for _, k in markdown_headers]
+
+        # Column alignment
+        self.markdown_colalign = []
+        for column_header, _ in markdown_headers:
+            if column_header=="losingScore" or column_header=="awayScore":
+                # Justify losing/away scores to the right (opposite winning/home scores)
+                self.markdown_colalign.append("right")
+            elif self.name_style=="emoji" and column_header[-5:]=="Emoji":
+                # Center emoji team name columns
+                self.markdown_colalign.append("center")
+            else:
+                self.markdown_colalign.append("left")
+
     def make_table(self):
         """
         Get list of DataFrames and descriptions,
         and render each one as Markdown table
         """
         tables = self.game_data.parse()
-        for table in tables:
-            reason, df = table
-            desc = self.table_description(reason)
-            desc += " (asterisk indicates a postseason game)"
-            self._render_table(desc, df, reason)
-
-    def _render_table(self, description, df, reason):
-        """
-        Render a table as a Markdown table
-        """
-        # Cut data to table data only
-        cut = df[self.column_headers][:min(len(df), self.nresults)].copy()
-
-        # Bump season and game numbers by one (zero-indexed in dataframe)
-        # (Pandas is soooo intuitive)
-        plusone = lambda x : x + 1
-        new_season_column = cut['season'].apply(plusone)
-        new_game_column = cut['day'].apply(plusone)
-        cut = cut.assign(**{'season': new_season_column, 'day': new_game_column})
 
-        # Create name and odds labels
-        if self.options.win_loss:
-            pre = ['winning','losing']
+        # Open the output file once for all tables
+        if self.output_file is None:
+            out_context = contextlib.nullcontext(sys.stdout)
         else:
-            pre = ['home','away']
-
-        if self.options.name_style=='short':
-            namelabels = [j + 'TeamNickname' for j in pre]
-        elif self.options.name_style=='long':
-            namelabels = [j + 'TeamName' for j in pre]
-        elif self.options.name_style=='emoji':
-            namelabels = [j + 'TeamEmoji' for j in pre]
+            out_context = open(self.output_file, 'a')
 
-        oddslabels = [j + 'Odds' for j in pre]
+        with out_context as out:
+            for table in tables:
+                reason, df = table
+                desc = self.table_description(reason)
+                desc += " (asterisk indicates a postseason game)"
+                self._render_table(desc, df, reason, out)
 
-        # Replace Team with Team (X%)
-        if reason=='underdog':
-            # Eventually we may want to do this with ALL reasons
-            for namelabel, oddslabel in zip(namelabels, oddslabels):
-                addodds = lambda row: "%s (%d%%)"%(row[namelabel], round(100*row[oddslabel]))
-                try:
-                    cut[namelabel] = cut[[namelabel, oddslabel]].apply(addodds, axis=1)
-                except KeyError:
-                    print(cut.columns)
-                    print(cut)
-                    sys.exit(1)
+    def _render_table(self, description, df, reason, out):
+        """
+        Render a table as a Markdown table,
+        writing it to the file object out
+        """
+        cut = self._prepare_cut(df, reason, {False: '', True: '*'})
 
+        # Mark postseason games with an asterisk next to the day,
+        # rather than in a column of their own
+        cut['day'] = cut['day'] + cut['isPostseason']
+        cut = cut.drop(columns='isPostseason')
 
-        # Remove the odds columns
-        cut.drop(oddslabels, axis=1, inplace=True)
-
-        # Remove the odds headers
-        self.column_headers = [j for j in self.column_headers if 'Odds' not in j]
-        self.nice_column_headers = [j for j in self.nice_column_headers if 'Odds' not in j]
-
-        # Format the isPostseason column for printing (empty space if not, else Y)
-        postseason_lambda = lambda c: '' if c is False else '*'
-        new_postseason_column = cut['isPostseason'].apply(postseason_lambda)
-        cut = cut.assign(**{'isPostseason': new_postseason_column.values})
-
-        # Format any column ending in "Emoji" as emoji (hope this works!)
-        # (there must be a more efficient way to do this, but I really, really hate pandas now.)
-        for column_header in self.column_headers:
-            emoji_lambda = lambda x: chr(int(x, 16))
-            if column_header[-5:]=='Emoji':
-                new_column = cut[column_header].apply(emoji_lambda)
-                cut = cut.assign(**{column_header: new_column})
-
-        # Make everything in the dataframe a string
-        cut = cut.applymap(str)
-
-        # This string is the final table in Markdown format
-        table = ""
-
-        # Start header line
-        table_header = "| "
-        # Start separator line (controls alignment)
-        table_sep = "| "
-        for column_header, nice_column_header in zip(self.column_headers, self.nice_column_headers):
-            if column_header == 'isPostseason':
-                continue
-            table_header += "%s | "%(nice_column_header)
-            if column_header=="losingScore" or column_header=="awayScore":
-                # Justify losing/away scores to the right (opposite winning/home scores)
-                table_sep += "------: | "
-            elif self.name_style=="emoji" and column_header[-5:]=="Emoji":
-                # Center emoji team name columns
-                table_sep += ":------: | "
-            else:
-                table_sep += "------ |"
-
-        table += table_header
-        table += "\n"
-        table += table_sep
-        table += "\n"
-
-        for i, row in cut.iterrows():
-            table_row = "| "
-            for k, val in zip(row.keys(), row.values):
-                if k == 'isPostseason':
-                    continue
-                elif k == 'day':
-                    table_row += "%s%s | "%(str(val), row['isPostseason'])
-                else:
-                    table_row += "%s | "%(str(val))
-            table += table_row
-            table += "\n"
-
-        # TODO
-        # Something something, DRY
-        # Something something, more pythonic
+        # Write the description, then the table in Markdown format
+        # straight to the output (everything is already a string,
+        # so don't let tabulate reparse numbers)
         if self.output_file is None:
-            print("\n\n")
-            print(description)
-            print("\n")
-            print(table)
+            out.write("\n\n\n%s\n\n\n"%(description))
         else:
-            with open(self.output_file, 'a') as f:
-                f.write("\n\n")
-                f.write(description)
-                f.write("\n")
-                f.write(table)
-
+            out.write("\n\n%s\n"%(description))
+        cut.to_markdown(
+            out,
+            index=False,
+            headers=self.markdown_nice_column_headers,
+            tablefmt='pipe',
+            colalign=self.markdown_colalign,
+            disable_numparse=True
+        )
+        if self.output_file is None:
+            out.write("\n\n")
+        else:
+            out.write("\n")